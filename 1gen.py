@@ -1,8 +1,11 @@
-from typing import Any
+from typing import Dict, List, Optional, Type
+import argparse
 
-import astor
 import ast
 
+from light import TokenScan, light_list
+from pipeline import Pipeline, add_arguments
+
 accept_list = ["For", "AsyncFor",
                "While", "If", "IfExp",
                "With", "AsyncWith", "Try",
@@ -10,35 +13,113 @@ accept_list = ["For", "AsyncFor",
 # This nodes be interpreted as names
 names_list = ["FunctionDef", "AsyncFunctionDef", "ClassDef"]
 
-if __name__ == "__main__":
-    files = astor.code_to_ast.find_py_files("./projects")
 
-    results = dict()
-    error_files = 0
-    all_files = 0
-    for i in files:
-        if "test" in i[1]:
+def node_types() -> List[Type[ast.AST]]:
+    # every node class gets a fixed slot in the census array
+    result = []
+    seen = set()
+    stack = [ast.AST]
+    while stack:
+        cls = stack.pop()
+        if cls in seen:
             continue
-        all_files += 1
-        try:
-            a = astor.code_to_ast.parse_file(i[0] + "/" + i[1])
-        except Exception as e:
-            print("ERROR", i[0] + "/" + i[1], ":", e)
-            error_files += 1
+        seen.add(cls)
+        result.append(cls)
+        stack.extend(cls.__subclasses__())
+    return result
+
+
+node_classes = node_types()
+type_index = {cls: i for i, cls in enumerate(node_classes)}
+
+
+def census(tree: ast.AST, counts: List[int]):
+    # same nodes as ast.walk, without the generator per node
+    index = type_index
+    node_cls = ast.AST
+    stack = [tree]
+    pop = stack.pop
+    push = stack.append
+    while stack:
+        node = pop()
+        cls = type(node)
+        counts[index[cls]] += 1
+        for name in cls._fields:
+            value = getattr(node, name, None)
+            if type(value) is list:
+                for item in value:
+                    if isinstance(item, node_cls):
+                        push(item)
+            elif isinstance(value, node_cls):
+                push(value)
+
+
+def report(counts: List[int], keys: Optional[List[str]] = None) -> Dict[str, int]:
+    results = dict()
+    for cls, count in zip(node_classes, counts):
+        key = cls.__name__
+        if count == 0 or (keys is not None and key not in keys):
             continue
+        results[key] = count
+    return results
+
+
+def check_light(path: str, tree: ast.AST) -> bool:
+    counts = [0] * len(node_classes)
+    census(tree, counts)
+    expected = report(counts, light_list)
+
+    scan = TokenScan()
+    scan.scan(path)
+    got = {k: v for k, v in scan.nodes.items() if v != 0}
+    if expected != got:
+        print("MISMATCH", path, ":", expected, "!=", got)
+        return False
+    return True
 
-        for g in ast.walk(a):
-            key = type(g).__name__
-            if not (key in accept_list or key in names_list):
-                continue
 
-            if key in results:
-                results[key] += 1
-            else:
-                results[key] = 1
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--all", action="store_true", help="report every node type, not only accept/names lists")
+    parser.add_argument("--light", action="store_true", help="count statement keywords from tokens, without an AST")
+    parser.add_argument("--check", type=int, default=0, metavar="N",
+                        help="cross-check light counts against the AST on the first N files")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.light and (args.all or args.check):
+        parser.error("--light counts statement keywords only, it cannot be combined with --all or --check")
+
+    pipeline = Pipeline.from_args(args)
+    counts = [0] * len(node_classes)
+    scan = TokenScan()
+    checked = 0
+    mismatches = 0
+    if args.light:
+        for path, names in pipeline.light(scan):
+            pass
+    else:
+        for path, a in pipeline:
+            census(a, counts)
+            if checked < args.check:
+                checked += 1
+                if not check_light(path, a):
+                    mismatches += 1
+            del a
 
+    if args.light:
+        results = {k: v for k, v in scan.nodes.items() if v != 0}
+    else:
+        results = report(counts, None if args.all else accept_list + names_list)
     results = {k: v for k, v in sorted(results.items(), key=lambda item: item[1], reverse=True)}
     for k in results:
         print(k, ": ", results[k])
 
-    print("From all", all_files, "will reviewed", 1 - (error_files / all_files), "%")
+    if args.light:
+        print("Nesting:")
+        for (key, value) in sorted(scan.nesting.items()):
+            print("\t", key, "\t", value)
+
+    if checked:
+        print("Light check:", checked, "files,", mismatches, "mismatches")
+
+    pipeline.report()
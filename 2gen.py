@@ -1,9 +1,13 @@
 from typing import Any, Tuple
-import astor
+import argparse
 import ast
+import os
 import re
 from enum import Enum
 
+from light import TokenScan
+from pipeline import Pipeline, add_arguments, default_root
+
 
 # from https://stackoverflow.com/questions/1175208/elegant-python-function-to-convert-camelcase-to-snake-case
 def camel_to_snake(name):
@@ -14,6 +18,14 @@ def camel_to_snake(name):
 negative_op = [ast.NotEq, ast.NotIn, ast.IsNot]
 
 
+def merge_counts(result: dict, other: dict):
+    for (key, value) in other.items():
+        if key in result:
+            result[key] += value
+        else:
+            result[key] = value
+
+
 class Order(Enum):
     Single = 1
     Semi = 2
@@ -217,6 +229,19 @@ class IfVertical(ast.NodeVisitor):
         self.check_vertical(node)
         return node
 
+    def merge(self, other: "IfVertical"):
+        self.negative += other.negative
+        self.all += other.all
+        merge_counts(self.complex, other.complex)
+        merge_counts(self.vertical, other.vertical)
+        self.elses += other.elses
+
+        self.single += other.single
+        self.decr += other.decr
+        self.semi += other.semi
+        self.incr += other.incr
+        self.equal += other.equal
+
 
 class Func(ast.NodeVisitor):
     def __init__(self):
@@ -363,14 +388,17 @@ class Func(ast.NodeVisitor):
             if arg.annotation:
                 self.arg_types += 1
 
-    def check_function_def(self, node: ast.FunctionDef):
+    def check_function_name(self, name):
         self.count += 1
+        self.check_name_pep8(name)
+        self.check_length_of_names(name)
+
+    def check_function_def(self, node: ast.FunctionDef):
+        self.check_function_name(node.name)
         self.check_types(node.args)
         self.count_args(node.args)
         self.check_args_pep8(node.args)
         self.check_args_len(node.args)
-        self.check_name_pep8(node.name)
-        self.check_length_of_names(node.name)
         self.check_body(node)
 
     def generic_visit(self, node: ast.AST) -> Any:
@@ -379,6 +407,16 @@ class Func(ast.NodeVisitor):
 
         return ast.NodeVisitor.generic_visit(self, node)
 
+    def merge(self, other: "Func"):
+        self.count += other.count
+        merge_counts(self.args, other.args)
+        merge_counts(self.pep8_names, other.pep8_names)
+        merge_counts(self.len_names, other.len_names)
+        merge_counts(self.pep8_args, other.pep8_args)
+        self.arg_types += other.arg_types
+        merge_counts(self.len_args, other.len_args)
+        merge_counts(self.body_size, other.body_size)
+
 
 class ForHelper(ast.NodeVisitor):
     def __init__(self):
@@ -494,6 +532,18 @@ class For(ast.NodeVisitor):
         for stmt in node.orelse:
             self.visit(stmt)
 
+    def merge(self, other: "For"):
+        self.all += other.all
+        self.with_else += other.with_else
+
+        self.num_while += other.num_while
+        self.num_continue += other.num_continue
+        self.num_break += other.num_break
+        self.num_return += other.num_return
+
+        merge_counts(self.temp, other.temp)
+        merge_counts(self.body_size, other.body_size)
+
 
 class F:
     def __init__(self):
@@ -527,26 +577,31 @@ class Width(ast.NodeVisitor):
         for n in body:
             w.visit(n)
 
-        self.func += w.func
-        self.afunc += w.afunc
-        self.fors += w.fors
-        self.afors += w.afors
-        self.whiles += w.whiles
-        self.ifs += w.ifs
-        self.withs += w.withs
-        self.awiths += w.awiths
-        self.trys += w.trys
-        self.ex_h += w.ex_h
-        self.classes += w.classes
-
-        if self.max_depth < w.max_depth:
-            self.max_depth = w.max_depth
+        self.merge(w)
 
         if self.current_depth == 0:
             if w.max_depth not in self.width:
                 self.width[w.max_depth] = 0
             self.width[w.max_depth] += 1
 
+    def merge(self, other: "Width"):
+        merge_counts(self.width, other.width)
+
+        self.func += other.func
+        self.afunc += other.afunc
+        self.fors += other.fors
+        self.afors += other.afors
+        self.whiles += other.whiles
+        self.ifs += other.ifs
+        self.withs += other.withs
+        self.awiths += other.awiths
+        self.trys += other.trys
+        self.ex_h += other.ex_h
+        self.classes += other.classes
+
+        if self.max_depth < other.max_depth:
+            self.max_depth = other.max_depth
+
     def visit_ClassDef(self, node: ast.ClassDef) -> Any:
         self.classes += 1
         self.check_body(node.body)
@@ -610,27 +665,83 @@ class Width(ast.NodeVisitor):
         return node
 
 
-if __name__ == "__main__":
-    files = astor.code_to_ast.find_py_files("./projects")
+class Metrics:
+    def __init__(self):
+        self.v = IfVertical()
+        self.f = Func()
+        self.fl = For()
+        self.w = Width()
+
+    def visit(self, tree: ast.AST):
+        self.v.visit(tree)
+        self.f.visit(tree)
+        self.fl.visit(tree)
+        self.w.visit(tree)
+
+    def merge(self, other: "Metrics"):
+        self.v.merge(other.v)
+        self.f.merge(other.f)
+        self.fl.merge(other.fl)
+        self.w.merge(other.w)
+
+    def state(self) -> dict:
+        # flat "Visitor.field" -> counter or histogram, zeros left out; see compare.py
+        result = dict()
+        for (name, visitor) in (("If", self.v), ("Func", self.f), ("For", self.fl), ("Width", self.w)):
+            for (key, value) in vars(visitor).items():
+                if key == "current_depth" or key == "max_depth":
+                    continue
+                if isinstance(value, dict):
+                    value = {str(k): n for (k, n) in value.items() if n}
+                if value:
+                    result[name + "." + key] = value
+        return result
+
 
-    v = IfVertical()
+def light_func(path: str) -> Func:
     f = Func()
-    fl = For()
-    w = Width()
-    for i in files:
-        if "test" in i[1]:
-            continue
-        try:
-            a = astor.code_to_ast.parse_file(i[0] + "/" + i[1])
-        except Exception as e:
-            print("ERROR", i[0] + "/" + i[1], ":", e)
-            continue
-        v.visit(a)
-        f.visit(a)
-        fl.visit(a)
-        w.visit(a)
-
-    all_for = 57083  # 231
+    for name in TokenScan().scan(path):
+        f.check_function_name(name)
+    return f
+
+
+def check_light(path: str, tree: ast.AST) -> bool:
+    expected = Func()
+    expected.visit(tree)
+    got = light_func(path)
+
+    for key in ("count", "pep8_names", "len_names"):
+        if getattr(expected, key) != getattr(got, key):
+            print("MISMATCH", path, key, ":", getattr(expected, key), "!=", getattr(got, key))
+            return False
+    return True
+
+
+def print_light(f: Func):
+    print("\nFunc (light)\n")
+
+    print("All:", f.count)
+
+    t = 0
+    print("Names length:")
+    for (key, value) in sorted(f.len_names.items()):
+        print("\t", key, "\t", value)
+        t += value
+    assert t == f.count
+
+    t = 0
+    print("Names:")
+    for (key, value) in sorted(f.pep8_names.items()):
+        print("\t", key, "\t", value)
+        t += value
+    assert t == f.count
+
+
+def print_metrics(metrics: Metrics, corpus=False):
+    # corpus: totals are the whole default tree, check them against the first analyzer
+    v, f, fl, w = metrics.v, metrics.f, metrics.fl, metrics.w
+
+    all_for = 57083 if corpus else fl.all  # 231
     print("\nFor\n")
 
     print("All:", fl.all)
@@ -649,7 +760,7 @@ if __name__ == "__main__":
         for_body_count += value
     assert for_body_count == fl.all
 
-    all_func = 221050
+    all_func = 221050 if corpus else f.count
     print("\nFunc\n")
 
     print("All:", f.count)
@@ -715,7 +826,7 @@ if __name__ == "__main__":
         fun_body_count += value
     assert fun_body_count == f.count
 
-    all_if = 278613
+    all_if = 278613 if corpus else v.all
     print("\nIf\n")
 
     print("Negativity")
@@ -755,6 +866,9 @@ if __name__ == "__main__":
     for (key, value) in sorted(w.width.items()):
         print("\t", key, "\t", value)
 
+    if not corpus:
+        return
+
     # from first analyzer - classes nodes
     assert w.ifs == all_if
     assert w.func == all_func
@@ -767,3 +881,80 @@ if __name__ == "__main__":
     assert w.awiths == 210
     assert w.afors == 38
     assert w.classes == 45838
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--light", action="store_true", help="only Func name metrics, from tokens, without an AST")
+    parser.add_argument("--check", type=int, default=0, metavar="N",
+                        help="cross-check light Func names against the AST on the first N files")
+    parser.add_argument("--depth", type=int, metavar="N",
+                        help="group metrics by the first N directories under --root (default 1, the project)")
+    parser.add_argument("--breakdown", action="store_true", help="also report every group before the total")
+    parser.add_argument("--save", metavar="PATH", help="store aggregate, group and per-file results for compare.py")
+    add_arguments(parser)
+    args = parser.parse_args()
+    if args.light and (args.check or args.save or args.breakdown or args.depth is not None):
+        parser.error("--light only reports Func names, it cannot be combined with --check, --save, --breakdown or --depth")
+    if args.depth is None:
+        args.depth = 1
+
+    pipeline = Pipeline.from_args(args)
+
+    if args.light:
+        f = Func()
+        for path, names in pipeline.light(TokenScan()):
+            for name in names:
+                f.check_function_name(name)
+        print_light(f)
+    else:
+        groups = dict()
+        partials = dict()
+        checked = 0
+        mismatches = 0
+        for path, a in pipeline:
+            if checked < args.check:
+                checked += 1
+                if not check_light(path, a):
+                    mismatches += 1
+            key = pipeline.group(path, args.depth)
+            if key not in groups:
+                groups[key] = Metrics()
+            if args.save:
+                partial = Metrics()
+                partial.visit(a)
+                partials[pipeline.relative(path)] = partial.state()
+                groups[key].merge(partial)
+            else:
+                groups[key].visit(a)
+            del a
+
+        if checked:
+            print("Light check:", checked, "files,", mismatches, "mismatches")
+
+        total = Metrics()
+        for key in sorted(groups):
+            total.merge(groups[key])
+
+        if args.save:
+            import compare
+            compare.save(args.save, {
+                "depth": args.depth,
+                "all_files": pipeline.all_files,
+                "error_files": pipeline.error_files,
+                "aggregate": total.state(),
+                "groups": {key: groups[key].state() for key in groups},
+                "files": partials,
+            })
+
+        if args.breakdown:
+            for key in sorted(groups):
+                print("\n====", key, "====")
+                print_metrics(groups[key])
+            print("\n==== all ====")
+        # the hard-coded totals only hold for the full tree, with nothing recovered or skipped
+        full_tree = os.path.realpath(args.root) == os.path.realpath(default_root)
+        corpus = full_tree and not args.retry and not pipeline.over_ceiling
+        print_metrics(total, corpus=corpus)
+
+    pipeline.report()
@@ -0,0 +1,70 @@
+from typing import List
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Startup cost of the analyzers: interpreter, imports and argparse (--help),
+# and a whole run over a tree with a single small file (time to first file).
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+entry_points = [
+    ["1gen.py"],
+    ["1gen.py", "--light"],
+    ["2gen.py"],
+    ["2gen.py", "--light"],
+]
+
+
+def timings(command: List[str], cwd: str, repeat: int) -> List[float]:
+    # one untimed run first, so the page cache is warm for every timed one
+    subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    result = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        result.append(time.perf_counter() - start)
+    return sorted(result)
+
+
+def spread(samples: List[float], base: float) -> str:
+    # best, median and worst run, minus the interpreter's best
+    best = samples[0] - base
+    median = samples[len(samples) // 2] - base
+    worst = samples[-1] - base
+    return "%.1f ms (median %.1f, worst %.1f)" % (best * 1000, median * 1000, worst * 1000)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per measurement")
+    parser.add_argument("--file", default=os.path.join(here, "light.py"), help="the single file to analyze")
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp()
+    try:
+        os.makedirs(os.path.join(work, "bench"))
+        shutil.copy(args.file, os.path.join(work, "bench", "one.py"))
+
+        python = timings([sys.executable, "-c", "pass"], work, args.repeat)
+        print("Interpreter:", spread(python, 0))
+        base = python[0]
+
+        # every entry point imports typing (the analyzers annotate with it), so it
+        # is a fixed share of each import time below
+        typing = timings([sys.executable, "-c", "import typing"], work, args.repeat)
+        print("typing:", spread(typing, base))
+
+        for entry in entry_points:
+            script = [sys.executable, os.path.join(here, entry[0])] + entry[1:]
+            imports = timings(script + ["--help"], work, args.repeat)
+            first = timings(script + ["--root", work, "--failure-cache", ""], work, args.repeat)
+            print(" ".join(entry))
+            print("\t", "import:", "\t", spread(imports, base))
+            print("\t", "first file:", "\t", spread(first, base))
+    finally:
+        shutil.rmtree(work)
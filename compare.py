@@ -0,0 +1,148 @@
+from typing import Dict, List, Tuple
+import argparse
+import json
+
+# Compare two result sets saved by `2gen.py --save`, without re-parsing anything.
+
+version = 1
+
+
+def save(path: str, results: dict):
+    results = dict(results, version=version)
+    with open(path, "w") as f:
+        json.dump(results, f)
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        results = json.load(f)
+    if results.get("version") != version:
+        raise ValueError(path + ": unsupported result version " + str(results.get("version")))
+    return results
+
+
+def total(value) -> int:
+    if isinstance(value, dict):
+        return sum(value.values())
+    return value
+
+
+def shift(old, new) -> float:
+    # histograms: total variation distance of the normalized distributions,
+    # counters: relative change
+    if isinstance(old, dict) or isinstance(new, dict):
+        old = old or dict()
+        new = new or dict()
+        old_all = sum(old.values()) or 1
+        new_all = sum(new.values()) or 1
+        result = 0.0
+        for key in set(old) | set(new):
+            result += abs(old.get(key, 0) / old_all - new.get(key, 0) / new_all)
+        return result / 2
+
+    old = old or 0
+    new = new or 0
+    return abs(new - old) / max(abs(old), 1)
+
+
+def moved(old, new) -> int:
+    # how many counts a partial (file or group) moved for one metric
+    if isinstance(old, dict) or isinstance(new, dict):
+        old = old or dict()
+        new = new or dict()
+        result = 0
+        for key in set(old) | set(new):
+            result += abs(new.get(key, 0) - old.get(key, 0))
+        return result
+    return abs((new or 0) - (old or 0))
+
+
+def metric_kind(old: dict, new: dict, metric: str) -> str:
+    value = old["aggregate"].get(metric, new["aggregate"].get(metric))
+    return "histogram" if isinstance(value, dict) else "counter"
+
+
+def rank(old: dict, new: dict) -> List[Tuple[float, str]]:
+    result = []
+    for metric in set(old) | set(new):
+        s = shift(old.get(metric), new.get(metric))
+        if s != 0:
+            result.append((s, metric))
+    result.sort(reverse=True)
+    return result
+
+
+def trace(metric: str, old: Dict[str, dict], new: Dict[str, dict]) -> List[Tuple[int, str]]:
+    result = []
+    for key in set(old) | set(new):
+        a = old.get(key, dict()).get(metric)
+        b = new.get(key, dict()).get(metric)
+        if a == b:
+            continue
+        result.append((moved(a, b), key))
+    result.sort(reverse=True)
+    return result
+
+
+def histogram_key(key: str):
+    # histogram keys are stored as strings, but most of them are numbers
+    if key.lstrip("-").isdigit():
+        return 0, int(key), ""
+    return 1, 0, key
+
+
+def print_histogram(old, new):
+    old = old or dict()
+    new = new or dict()
+    for key in sorted(set(old) | set(new), key=histogram_key):
+        a = old.get(key, 0)
+        b = new.get(key, 0)
+        if a != b:
+            print("\t\t", key, "\t", a, "->", b)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="rank metric shifts between two saved analysis runs")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--top", type=int, default=10, help="how many histograms and counters to trace")
+    parser.add_argument("--files", type=int, default=5, help="how many groups and files to list per metric")
+    args = parser.parse_args()
+
+    old = load(args.old)
+    new = load(args.new)
+
+    # groups are only comparable when both runs cut the tree at the same depth
+    same_depth = old["depth"] == new["depth"]
+    if not same_depth:
+        print("WARNING: runs grouped at --depth %d and %d, groups are not traced" % (old["depth"], new["depth"]))
+
+    print("Files:", old["all_files"], "->", new["all_files"])
+    print("Errors:", old["error_files"], "->", new["error_files"])
+
+    ranked = rank(old["aggregate"], new["aggregate"])
+    histograms = [(s, metric) for (s, metric) in ranked if metric_kind(old, new, metric) == "histogram"]
+    counters = [(s, metric) for (s, metric) in ranked if metric_kind(old, new, metric) == "counter"]
+
+    for (title, shifts) in (("Histograms", histograms), ("Counters", counters)):
+        print("\n" + title + ":")
+        for (s, metric) in shifts:
+            a = old["aggregate"].get(metric)
+            b = new["aggregate"].get(metric)
+            print("\t", "%.4f" % s, "\t", metric, "\t", total(a or 0), "->", total(b or 0))
+
+    for (s, metric) in histograms[:args.top] + counters[:args.top]:
+        a = old["aggregate"].get(metric)
+        b = new["aggregate"].get(metric)
+        print("\n" + metric, "(%.4f)" % s)
+        if isinstance(a, dict) or isinstance(b, dict):
+            print_histogram(a, b)
+
+        if same_depth:
+            print("\tGroups:")
+            for (size, key) in trace(metric, old["groups"], new["groups"])[:args.files]:
+                print("\t\t", size, "\t", key)
+
+        print("\tFiles:")
+        for (size, key) in trace(metric, old["files"], new["files"])[:args.files]:
+            print("\t\t", size, "\t", key)
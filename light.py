@@ -0,0 +1,115 @@
+from typing import Dict, List
+import tokenize
+
+# Statement keywords and the AST node they open. Only the first token of a
+# logical line counts, so comprehension `for`/`if` and IfExp are left out.
+statement_nodes = {
+    "for": "For",
+    "while": "While",
+    "if": "If",
+    "elif": "If",
+    "with": "With",
+    "try": "Try",
+    "def": "FunctionDef",
+    "class": "ClassDef",
+}
+async_nodes = {
+    "for": "AsyncFor",
+    "with": "AsyncWith",
+    "def": "AsyncFunctionDef",
+}
+
+# Node types the token stream can count exactly, for cross-checks against the AST.
+# A `try` whose handlers are `except*` is a TryStar (3.11+), see scan_tokens.
+light_list = sorted(set(statement_nodes.values()) | set(async_nodes.values()) | {"TryStar"})
+
+
+class TokenScan:
+    def __init__(self):
+        self.nodes = dict()
+        for key in light_list:
+            self.nodes[key] = 0
+
+        # max INDENT depth of each top-level block
+        self.nesting = dict()
+
+    def scan(self, path: str) -> List[str]:
+        with tokenize.open(path) as f:
+            return self.scan_tokens(tokenize.generate_tokens(f.readline))
+
+    def scan_tokens(self, tokens) -> List[str]:
+        names = []
+        nodes: Dict[str, int] = dict()
+        nesting: Dict[int, int] = dict()
+
+        start = True
+        is_async = False
+        is_def = False
+        is_except = False
+        # depth -> the last `try` there is still counted as Try
+        open_try = dict()
+        depth = 0
+        max_depth = 0
+        for tok in tokens:
+            kind = tok.type
+            if kind == tokenize.NEWLINE:
+                start = True
+                continue
+            if kind == tokenize.INDENT:
+                depth += 1
+                if depth > max_depth:
+                    max_depth = depth
+                start = True
+                continue
+            if kind == tokenize.DEDENT:
+                depth -= 1
+                if depth == 0:
+                    if max_depth not in nesting:
+                        nesting[max_depth] = 0
+                    nesting[max_depth] += 1
+                    max_depth = 0
+                start = True
+                continue
+            if kind == tokenize.NL or kind == tokenize.COMMENT:
+                continue
+
+            if is_def and kind == tokenize.NAME:
+                names.append(tok.string)
+            is_def = False
+
+            if is_except and tok.string == "*" and open_try.get(depth):
+                nodes["Try"] -= 1
+                nodes["TryStar"] = nodes.get("TryStar", 0) + 1
+                open_try[depth] = False
+            is_except = False
+
+            if start and kind == tokenize.NAME:
+                word = tok.string
+                if is_async:
+                    key = async_nodes.get(word)
+                else:
+                    key = statement_nodes.get(word)
+                if key is not None:
+                    if key not in nodes:
+                        nodes[key] = 0
+                    nodes[key] += 1
+                    # Func only looks at plain FunctionDef names
+                    is_def = key == "FunctionDef"
+                    if key == "Try":
+                        open_try[depth] = True
+                elif word == "except" and not is_async:
+                    is_except = True
+                if word == "async":
+                    is_async = True
+                    continue
+            is_async = False
+            start = False
+
+        # tokenize raised nothing, so the file is fully counted
+        for key, value in nodes.items():
+            self.nodes[key] += value
+        for key, value in nesting.items():
+            if key not in self.nesting:
+                self.nesting[key] = 0
+            self.nesting[key] += value
+        return names
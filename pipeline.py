@@ -0,0 +1,380 @@
+from typing import Iterator, List, Optional, Tuple
+import ast
+import gc
+import heapq
+import io
+import os
+import resource
+import sys
+import tokenize
+
+# json and hashlib are imported where they are used: the failure cache is only
+# read when its file exists and written when there is something to record, and
+# hashes are only taken for files that failed to parse.
+
+default_root = "./projects"
+
+# bump when the recovery strategies change, so cached failures get another try
+recovery_version = 1
+parser_version = "python %d.%d.%d, recovery %d" % (sys.version_info[:3] + (recovery_version,))
+
+page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def peak_rss() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        return peak
+    return peak * 1024
+
+
+def current_rss() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * page_size
+    except OSError:
+        # no procfs, the high-water mark is the best we have
+        return peak_rss()
+
+
+def mib(size: int) -> str:
+    return "%.1f MiB" % (size / (1 << 20))
+
+
+def content_hash(data: bytes) -> str:
+    import hashlib
+    return hashlib.sha1(data).hexdigest()
+
+
+# Same results as astor.code_to_ast.find_py_files/parse_file, without importing astor.
+def find_py_files(srctree: str) -> Iterator[Tuple[str, str]]:
+    if not os.path.isdir(srctree):
+        yield os.path.split(srctree)
+    for srcpath, _, fnames in os.walk(srctree):
+        for fname in fnames:
+            if fname.endswith(".py"):
+                yield srcpath, fname
+
+
+def parse_file(path: str) -> ast.AST:
+    with tokenize.open(path) as f:
+        source = f.read()
+    return ast.parse(normalize(source), filename=path)
+
+
+def decode_fallback(data: bytes) -> str:
+    try:
+        encoding, _ = tokenize.detect_encoding(io.BytesIO(data).readline)
+        return data.decode(encoding)
+    except (SyntaxError, LookupError, UnicodeDecodeError):
+        # unknown or wrong coding cookie, latin-1 decodes anything
+        return data.decode("latin-1")
+
+
+def normalize(source: str) -> str:
+    source = source.replace("\r\n", "\n").replace("\r", "\n")
+    if not source.endswith("\n"):
+        source += "\n"
+    return source
+
+
+# Cheaper ways to get a tree out of files the normal parse rejects, tried in order.
+# Each one keeps the previous fixes.
+def recover_encoding(source: str) -> ast.AST:
+    return ast.parse(source)
+
+
+def recover_feature_version(source: str) -> ast.AST:
+    # async/await are plain names before 3.7
+    return ast.parse(source, feature_version=(3, 4))
+
+
+def recover_tabs(source: str) -> ast.AST:
+    # Python 2 allowed mixing tabs and spaces, a tab stop there is 8 columns
+    return ast.parse(source.expandtabs(8), feature_version=(3, 4))
+
+
+recovery = [
+    ("encoding", recover_encoding),
+    ("feature_version", recover_feature_version),
+    ("tabs", recover_tabs),
+]
+
+
+def add_arguments(parser):
+    parser.add_argument("--root", default=default_root, help="source tree to analyze")
+    parser.add_argument("--max-rss", type=int, default=0, metavar="MB",
+                        help="defer large files while RSS is above this ceiling")
+    parser.add_argument("--large-file", type=int, default=1024, metavar="KB",
+                        help="files of at least this size are held back by --max-rss")
+    parser.add_argument("--memory-top", type=int, default=10, metavar="N",
+                        help="how many files to list in the memory report")
+    parser.add_argument("--failure-cache", default=".parse_failures.json", metavar="PATH",
+                        help="where parse failures are remembered between runs, empty to disable")
+    parser.add_argument("--retry", action="store_true",
+                        help="try cheaper recovery strategies on files that fail to parse")
+
+
+class Pipeline:
+    def __init__(self, root=default_root, max_rss=0, large_file=1024, memory_top=10,
+                 failure_cache=".parse_failures.json", retry=False):
+        self.root = root
+        self.ceiling = max_rss << 20
+        self.large = large_file << 10
+        self.top = memory_top
+        self.failure_cache = failure_cache
+        self.retry = retry
+
+        self.all_files = 0
+        self.error_files = 0
+        self.trees = 0
+        self.deferred = 0
+        # large files still over the ceiling after the deferred pass, never parsed
+        self.over_ceiling = []
+
+        # absolute path -> size, mtime, hash, error class, message, parser and the strategy that recovered it
+        self.failures = dict()
+        if failure_cache and os.path.exists(failure_cache):
+            import json
+            with open(failure_cache) as f:
+                self.failures = json.load(f)
+        # what this run learned: path -> new entry, or None once the file parses again
+        self.next_failures = dict()
+        self.cached = 0
+        self.recovered = dict()
+
+        # files that pushed the process high-water mark up, and by how much
+        self.raised = dict()
+        # (RSS growth while the tree was alive, path) of the heaviest trees
+        self.heavy: List[Tuple[int, str]] = []
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(args.root, args.max_rss, args.large_file, args.memory_top, args.failure_cache, args.retry)
+
+    def files(self) -> Iterator[str]:
+        for i in find_py_files(self.root):
+            if "test" in i[1]:
+                continue
+            yield i[0] + "/" + i[1]
+
+    def relative(self, path: str) -> str:
+        # the same file gets the same key from any checkout or --root
+        return os.path.relpath(path, self.root).replace(os.sep, "/")
+
+    def group(self, path: str, depth=1) -> str:
+        # first `depth` directories under the root, depth 1 is the project
+        parts = self.relative(path).split("/")[:-1]
+        return "/".join(parts[:depth]) or os.curdir
+
+    def admit(self, path: str) -> bool:
+        if not self.ceiling or current_rss() < self.ceiling:
+            return True
+        try:
+            return os.path.getsize(path) < self.large
+        except OSError:
+            return True
+
+    def __iter__(self) -> Iterator[Tuple[str, ast.AST]]:
+        # Callers must drop the tree (del) before asking for the next one,
+        # otherwise two trees are alive while the next file is parsed.
+        deferred = []
+        for path in self.files():
+            if not self.admit(path):
+                deferred.append(path)
+                continue
+            yield from self.process(path)
+
+        self.deferred = len(deferred)
+        for path in deferred:
+            gc.collect()
+            if not self.admit(path):
+                print("SKIPPED", path, ": RSS over the", mib(self.ceiling), "ceiling")
+                self.all_files += 1
+                self.over_ceiling.append(path)
+                continue
+            yield from self.process(path)
+
+        self.save_failures()
+
+    def light(self, scan) -> Iterator[Tuple[str, List[str]]]:
+        # token-only pass with the same file and error bookkeeping, no trees
+        for path in self.files():
+            self.all_files += 1
+            try:
+                names = scan.scan(path)
+            except Exception as e:
+                print("ERROR", path, ":", e)
+                self.error_files += 1
+                continue
+            yield path, names
+
+    def process(self, path: str) -> Iterator[Tuple[str, ast.AST]]:
+        self.all_files += 1
+        before = current_rss()
+        peak = peak_rss()
+        tree = self.parse(path)
+        if tree is None:
+            self.error_files += 1
+            return
+
+        self.trees += 1
+        growth = current_rss() - before
+        if len(self.heavy) < self.top:
+            heapq.heappush(self.heavy, (growth, path))
+        elif growth > self.heavy[0][0]:
+            heapq.heapreplace(self.heavy, (growth, path))
+
+        yield path, tree
+        del tree
+
+        after = peak_rss()
+        if after > peak:
+            self.raised[path] = after - peak
+
+    def cached_failure(self, path: str) -> Optional[dict]:
+        entry = self.failures.get(os.path.abspath(path))
+        if entry is None or entry["parser"] != parser_version or "message" not in entry:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+            return entry
+
+        # touched but maybe not changed
+        with open(path, "rb") as f:
+            if content_hash(f.read()) != entry["hash"]:
+                return None
+        entry["size"] = stat.st_size
+        entry["mtime"] = stat.st_mtime_ns
+        return entry
+
+    def parse(self, path: str) -> Optional[ast.AST]:
+        # the same file from any cwd or spelling of --root shares one entry
+        key = os.path.abspath(path)
+        entry = self.cached_failure(path)
+        cached = entry is not None
+        if entry is None:
+            try:
+                tree = parse_file(path)
+                if key in self.failures:
+                    self.next_failures[key] = None
+                return tree
+            except Exception as e:
+                print("ERROR", path, ":", e)
+                entry = self.record_failure(path, e)
+                if entry is None:
+                    return None
+        else:
+            self.cached += 1
+        self.next_failures[key] = entry
+
+        tree = None
+        if self.retry:
+            tree = self.recover(path, entry)
+        if tree is None and cached:
+            # same line as the first time, the Failures report counts cached ones
+            print("ERROR", path, ":", entry["message"])
+        return tree
+
+    def record_failure(self, path: str, e: Exception) -> Optional[dict]:
+        try:
+            stat = os.stat(path)
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime_ns,
+            "hash": content_hash(data),
+            "error": type(e).__name__,
+            "message": str(e),
+            "parser": parser_version,
+            "recovered": None,
+        }
+
+    def recover(self, path: str, entry: dict) -> Optional[ast.AST]:
+        try:
+            with open(path, "rb") as f:
+                source = normalize(decode_fallback(f.read()))
+        except OSError:
+            return None
+
+        strategies = recovery
+        if entry["recovered"] is not None:
+            # what worked last time goes first
+            strategies = sorted(recovery, key=lambda item: item[0] != entry["recovered"])
+        for (name, strategy) in strategies:
+            try:
+                tree = strategy(source)
+            except Exception:
+                continue
+            print("RECOVERED", path, ":", name)
+            entry["recovered"] = name
+            self.recovered[name] = self.recovered.get(name, 0) + 1
+            return tree
+
+        entry["recovered"] = None
+        return None
+
+    def save_failures(self):
+        if not self.failure_cache or not (self.failures or self.next_failures):
+            return
+
+        # other roots share the cache, only touch the paths this run visited
+        failures = dict(self.failures)
+        for (path, entry) in self.next_failures.items():
+            if entry is None:
+                failures.pop(path, None)
+            else:
+                failures[path] = entry
+        # prune deleted files under the root this run walked; relative keys are an older format
+        root = os.path.abspath(self.root)
+        for path in list(failures):
+            if not os.path.isabs(path):
+                del failures[path]
+            elif (path == root or path.startswith(root + os.sep)) and not os.path.exists(path):
+                del failures[path]
+
+        import json
+        with open(self.failure_cache, "w") as f:
+            json.dump(failures, f, indent=1)
+
+    def report(self):
+        if self.all_files:
+            missed = self.error_files + len(self.over_ceiling)
+            print("From all", self.all_files, "will reviewed", 1 - (missed / self.all_files), "%")
+        if self.over_ceiling:
+            print("WARNING: partial results,", len(self.over_ceiling), "files skipped over the memory ceiling")
+
+        if self.failures or self.next_failures:
+            print("\nFailures\n")
+            print("Cached (not re-parsed):", self.cached)
+            print("Recorded:", len([e for e in self.next_failures.values() if e is not None]))
+            if self.retry:
+                print("Recovered:")
+                for (name, count) in sorted(self.recovered.items()):
+                    print("\t", name, "\t", count)
+
+        if self.trees == 0 and not self.over_ceiling:
+            return
+
+        print("\nMemory\n")
+        print("Worker", os.getpid(), "peak RSS:", mib(peak_rss()))
+        if self.ceiling:
+            print("Ceiling:", mib(self.ceiling), "deferred large files:", self.deferred)
+            print("Skipped over the ceiling:", len(self.over_ceiling))
+            for path in self.over_ceiling[:self.top]:
+                print("\t", path)
+
+        print("Raised peak RSS:")
+        raised = sorted(self.raised.items(), key=lambda item: item[1], reverse=True)
+        for (path, size) in raised[:self.top]:
+            print("\t", mib(size), "\t", path)
+
+        print("Heaviest trees:")
+        for (size, path) in sorted(self.heavy, reverse=True):
+            print("\t", mib(size), "\t", path)